@@ -1,13 +1,18 @@
 import logging
+import math
 import random
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from selection.candidate_generation import (
     candidates_per_query,
     syntactically_relevant_indexes,
 )
+from selection.cost_evaluation import CostEvaluation
 from selection.selection_algorithm import DEFAULT_PARAMETER_VALUES, SelectionAlgorithm
 from selection.utils import get_utilized_indexes, mb_to_b
+from selection.workload import Workload
 
 # budget_MB: The algorithm can utilize the specified storage budget in MB.
 # max_index_width: The number of columns an index can contain at maximum.
@@ -15,14 +20,43 @@ from selection.utils import get_utilized_indexes, mb_to_b
 #                         for further details
 # try_variations_max_removals: Maximum number of index candidates that are remover per
 #                              TryVariations step.
+# try_variations_benefit_tolerance: Variations whose summed index benefit is lower than
+#                                   the current selection's by more than this fraction
+#                                   are discarded without requesting their cost.
+#                                   None (default) evaluates all variations.
+# try_variations_patience: Number of evaluated variations without improvement after
+#                          which TryVariations exchanges twice as many indexes per
+#                          step. After twice this number, TryVariations restarts
+#                          from a randomly perturbed greedy selection. Discarded
+#                          variations count as variations without improvement.
+#                          None (default) disables both.
+# initial_selection: "greedy" (default) fills the budget in the order of the indexes'
+#                    benefit/size ratios as in the original paper. "knapsack" uses a
+#                    knapsack solution instead if its summed benefit is higher.
+# utilized_indexes_workers: Number of database connections that are used in parallel
+#                           to determine the indexes utilized by the queries. Only
+#                           applies to what-if cost estimations. Queries that create
+#                           views are all analyzed by the same worker.
 # The algorithm stops if the budget & the time for the TryVariations phase are exceeded.
 DEFAULT_PARAMETERS = {
     "budget_MB": DEFAULT_PARAMETER_VALUES["budget_MB"],
     "max_index_width": DEFAULT_PARAMETER_VALUES["max_index_width"],
     "try_variations_seconds": 10,
     "try_variations_max_removals": 4,
+    "try_variations_benefit_tolerance": None,
+    "try_variations_patience": None,
+    "initial_selection": "greedy",
+    "utilized_indexes_workers": 1,
 }
 
+# Maximum number of units the budget is split into for the knapsack-based selection
+KNAPSACK_CAPACITY_UNITS = 1000
+# Maximum number of index configurations whose workload cost is cached
+WORKLOAD_COST_CACHE_SIZE = 4096
+# Maximum relative deviation applied to the benefit/size ratios when the greedy
+# selection is perturbed for a TryVariations restart
+RESTART_PERTURBATION = 0.5
+
 
 # This algorithm resembles the index selection algorithm published in 2000 by Valentin
 # et al. Details can be found in the original paper:
@@ -41,6 +75,21 @@ class DB2AdvisAlgorithm(SelectionAlgorithm):
         self.disk_constraint = mb_to_b(self.parameters["budget_MB"])
         self.try_variations_seconds = self.parameters["try_variations_seconds"]
         self.try_variations_max_removals = self.parameters["try_variations_max_removals"]
+        self.try_variations_benefit_tolerance = self.parameters[
+            "try_variations_benefit_tolerance"
+        ]
+        self.try_variations_patience = self.parameters["try_variations_patience"]
+        assert (
+            self.try_variations_patience is None or self.try_variations_patience > 0
+        ), "try_variations_patience must be positive or None."
+        self.initial_selection = self.parameters["initial_selection"]
+        assert self.initial_selection in {"greedy", "knapsack"}
+        self.utilized_indexes_workers = self.parameters["utilized_indexes_workers"]
+        # Cache structure: {frozenset(indexes): workload cost}
+        # An algorithm instance only runs once and, hence, for a single workload.
+        # Therefore, the index configuration suffices as cache key. The least recently
+        # used entries are evicted if the cache exceeds WORKLOAD_COST_CACHE_SIZE.
+        self.workload_cost_cache = OrderedDict()
 
     def _calculate_best_indexes(self, workload):
         logging.info("Calculating best indexes DB2Advis")
@@ -52,18 +101,21 @@ class DB2AdvisAlgorithm(SelectionAlgorithm):
             self.parameters["max_index_width"],
             candidate_generator=syntactically_relevant_indexes,
         )
-        utilized_indexes, query_details = get_utilized_indexes(
-            workload, candidates, self.cost_evaluation, True
-        )
+        if (
+            self.utilized_indexes_workers > 1
+            and self.cost_evaluation.cost_estimation == "whatif"
+        ):
+            utilized_indexes, query_details = self._get_utilized_indexes_parallel(
+                workload, candidates
+            )
+        else:
+            utilized_indexes, query_details = get_utilized_indexes(
+                workload, candidates, self.cost_evaluation, True
+            )
 
         index_benefits = self._calculate_index_benefits(utilized_indexes, query_details)
         index_benefits_subsumed = self._combine_subsumed(index_benefits)
-        selected_index_benefits = []
-        disk_usage = 0
-        for index_benefit in index_benefits_subsumed:
-            if disk_usage + index_benefit.size() <= self.disk_constraint:
-                selected_index_benefits.append(index_benefit)
-                disk_usage += index_benefit.size()
+        selected_index_benefits = self._initial_selection(index_benefits_subsumed)
 
         if self.try_variations_seconds > 0:
             selected_index_benefits = self._try_variations(
@@ -71,21 +123,170 @@ class DB2AdvisAlgorithm(SelectionAlgorithm):
             )
         return [index_benefit.index for index_benefit in selected_index_benefits]
 
-    def _calculate_index_benefits(self, candidates, query_results):
-        indexes_benefit = []
+    # The original algorithm greedily fills the budget by decreasing benefit/size
+    # ratio. For the "knapsack" initial selection, the 0-1 knapsack problem over the
+    # index benefits is solved additionally and the selection with the higher summed
+    # benefit is used.
+    def _initial_selection(self, index_benefits):
+        greedy_selection = self._greedy_selection(index_benefits)
+        if self.initial_selection == "greedy":
+            return greedy_selection
 
-        for index_candidate in candidates:
-            benefit = 0
+        knapsack_selection = self._knapsack_selection(index_benefits)
 
-            for query, value in query_results.items():
-                if index_candidate not in value["utilized_indexes"]:
-                    continue
-                # TODO adjust when having weights for queries
-                benefit += value["cost_without_indexes"] - value["cost_with_indexes"]
+        greedy_benefit = sum(index_benefit.benefit for index_benefit in greedy_selection)
+        knapsack_benefit = sum(
+            index_benefit.benefit for index_benefit in knapsack_selection
+        )
+        if knapsack_benefit > greedy_benefit:
+            logging.debug(
+                f"Knapsack selection benefit {knapsack_benefit} exceeds greedy "
+                f"selection benefit {greedy_benefit}"
+            )
+            return knapsack_selection
+        return greedy_selection
+
+    def _greedy_selection(self, index_benefits):
+        selected_index_benefits = []
+        disk_usage = 0
+        for index_benefit in index_benefits:
+            if disk_usage + index_benefit.size() <= self.disk_constraint:
+                selected_index_benefits.append(index_benefit)
+                disk_usage += index_benefit.size()
+
+        return selected_index_benefits
+
+    # Solves the 0-1 knapsack problem via dynamic programming. To bound the effort,
+    # the budget is split into at most KNAPSACK_CAPACITY_UNITS units. Index sizes are
+    # rounded up to full units. Hence, the selection never exceeds the budget.
+    def _knapsack_selection(self, index_benefits):
+        unit_size = max(1, math.ceil(self.disk_constraint / KNAPSACK_CAPACITY_UNITS))
+        capacity = int(self.disk_constraint // unit_size)
+
+        # best_benefits[c]: highest summed benefit with a size of at most c units
+        best_benefits = [0] * (capacity + 1)
+        # Per index benefit: the capacities for which it is part of the best solution
+        # (for the index benefits considered so far) or None if it is never chosen
+        chosen_per_index_benefit = []
+        for index_benefit in index_benefits:
+            units = math.ceil(index_benefit.size() / unit_size)
+            if index_benefit.benefit <= 0 or units > capacity:
+                chosen_per_index_benefit.append(None)
+                continue
+
+            chosen = bytearray(capacity + 1)
+            for c in range(capacity, units - 1, -1):
+                benefit = best_benefits[c - units] + index_benefit.benefit
+                if benefit > best_benefits[c]:
+                    best_benefits[c] = benefit
+                    chosen[c] = 1
+            chosen_per_index_benefit.append(chosen)
+
+        selected_index_benefits = []
+        remaining_capacity = capacity
+        for index_benefit, chosen in reversed(
+            list(zip(index_benefits, chosen_per_index_benefit))
+        ):
+            if chosen is None or not chosen[remaining_capacity]:
+                continue
+            selected_index_benefits.append(index_benefit)
+            remaining_capacity -= math.ceil(index_benefit.size() / unit_size)
+
+        # Keep the order of the input
+        selected_index_benefits.reverse()
+        return selected_index_benefits
+
+    # The queries are analyzed independently of each other. Hypothetical indexes only
+    # exist per database session. Hence, every worker uses its own connector.
+    def _get_utilized_indexes_parallel(self, workload, candidates):
+        number_of_workers = min(self.utilized_indexes_workers, len(workload.queries))
+        if number_of_workers <= 1:
+            return get_utilized_indexes(workload, candidates, self.cost_evaluation, True)
+        logging.debug(f"Determine utilized indexes with {number_of_workers} workers")
+
+        queries_per_worker = [[] for _ in range(number_of_workers)]
+        candidates_per_worker = [[] for _ in range(number_of_workers)]
+        next_worker_id = 0
+        for query, query_candidates in zip(workload.queries, candidates):
+            # Views are created within the workers' uncommitted transactions. If two
+            # workers created the same view, one would block and then fail. Hence,
+            # all queries that create views are analyzed by the first worker.
+            if "create view" in query.text:
+                worker_id = 0
+            else:
+                worker_id = next_worker_id
+                next_worker_id = (next_worker_id + 1) % number_of_workers
+            queries_per_worker[worker_id].append(query)
+            candidates_per_worker[worker_id].append(query_candidates)
+
+        with ThreadPoolExecutor(max_workers=number_of_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._get_utilized_indexes_worker,
+                    Workload(queries),
+                    worker_candidates,
+                )
+                for queries, worker_candidates in zip(
+                    queries_per_worker, candidates_per_worker
+                )
+                if queries
+            ]
+            results = [future.result() for future in futures]
+
+        utilized_indexes = set()
+        details_per_query = {}
+        for (utilized_indexes_worker, query_details_worker), cost_evaluation in results:
+            utilized_indexes |= utilized_indexes_worker
+            details_per_query.update(query_details_worker)
+            self._add_worker_statistics(cost_evaluation)
+        query_details = {query: details_per_query[query] for query in workload.queries}
+
+        return utilized_indexes, query_details
+
+    def _get_utilized_indexes_worker(self, workload, candidates):
+        connector = type(self.database_connector)(self.database_connector.db_name)
+        cost_evaluation = CostEvaluation(connector)
+        try:
+            result = get_utilized_indexes(workload, candidates, cost_evaluation, True)
+        finally:
+            cost_evaluation.complete_cost_estimation()
+            connector.close()
+
+        return result, cost_evaluation
+
+    # The statistics of the workers are attributed to the algorithm's connector and
+    # cost evaluation to keep the reported numbers complete.
+    def _add_worker_statistics(self, cost_evaluation):
+        connector = cost_evaluation.db_connector
+        self.database_connector.simulated_indexes += connector.simulated_indexes
+        self.database_connector.cost_estimations += connector.cost_estimations
+        self.database_connector.cost_estimation_duration += (
+            connector.cost_estimation_duration
+        )
+        self.database_connector.index_simulation_duration += (
+            connector.index_simulation_duration
+        )
+        self.cost_evaluation.cost_requests += cost_evaluation.cost_requests
+        self.cost_evaluation.cache_hits += cost_evaluation.cache_hits
+
+    def _calculate_index_benefits(self, candidates, query_results):
+        # Attribute each query's benefit to its utilized indexes in a single pass over
+        # the queries instead of testing every candidate against every query.
+        benefit_per_index = {index_candidate: 0 for index_candidate in candidates}
+
+        for value in query_results.values():
+            # TODO adjust when having weights for queries
+            benefit = value["cost_without_indexes"] - value["cost_with_indexes"]
+            for utilized_index in value["utilized_indexes"]:
+                if utilized_index in benefit_per_index:
+                    benefit_per_index[utilized_index] += benefit
 
-            indexes_benefit.append(IndexBenefit(index_candidate, benefit))
+        indexes_benefit = [
+            IndexBenefit(index_candidate, benefit)
+            for index_candidate, benefit in benefit_per_index.items()
+        ]
 
-        return sorted(indexes_benefit, reverse=True)
+        return sorted(indexes_benefit, key=IndexBenefit.sort_key, reverse=True)
 
     # From the paper: "Combine any index subsumed
     # by an index with a higher ratio with that index."
@@ -102,84 +303,230 @@ class DB2AdvisAlgorithm(SelectionAlgorithm):
             key=lambda index_benefit: index_benefit.benefit_size_ratio(),
         ), "the input of _combine_subsumed must be sorted"
 
-        index_benefits_to_remove = set()
-        for high_ratio_pos, index_benefit_high_ratio in enumerate(index_benefits):
-            if index_benefit_high_ratio in index_benefits_to_remove:
+        # An index is combined with the first (highest ratio) remaining index that
+        # subsumes it, i.e., whose columns start with the index's columns. Instead of
+        # comparing all pairs, every remaining index registers its column prefixes.
+        # Since the input is processed by decreasing ratio, the first registration of
+        # a prefix belongs to the highest ratio index with that prefix.
+        # Structure: {column prefix: IndexBenefit}
+        subsuming_index_benefits = {}
+        remaining_index_benefits = []
+        for index_benefit in index_benefits:
+            columns = index_benefit.index.columns
+            if columns in subsuming_index_benefits:
+                subsuming_index_benefits[columns].benefit += index_benefit.benefit
                 continue
-            # Test all following elements (with lower ratios) in the list
-            iteration_pos = high_ratio_pos + 1
-            for index_benefit_lower_ratio in index_benefits[iteration_pos:]:
-                if index_benefit_lower_ratio in index_benefits_to_remove:
-                    continue
-                if index_benefit_high_ratio.index.subsumes(
-                    index_benefit_lower_ratio.index
-                ):
-                    index_benefit_high_ratio.benefit += index_benefit_lower_ratio.benefit
-                    index_benefits_to_remove.add(index_benefit_lower_ratio)
 
-        result_set = set(index_benefits) - index_benefits_to_remove
-        # Sorting of a set results in a list
-        return sorted(result_set, reverse=True)
+            remaining_index_benefits.append(index_benefit)
+            for prefix_width in range(1, len(columns) + 1):
+                subsuming_index_benefits.setdefault(columns[:prefix_width], index_benefit)
+
+        return sorted(remaining_index_benefits, key=IndexBenefit.sort_key, reverse=True)
 
     def _try_variations(self, selected_index_benefits, index_benefits, workload):
         logging.debug(f"Try variation for {self.try_variations_seconds} seconds")
         start_time = time.time()
 
-        not_used_index_benefits = set(index_benefits) - set(selected_index_benefits)
+        # The current selection and the remaining candidates are kept as lists to
+        # sample from them without rebuilding them in every iteration.
+        selected_index_benefits = list(set(selected_index_benefits))
+        not_used_index_benefits = list(set(index_benefits) - set(selected_index_benefits))
 
         min_length = min(len(selected_index_benefits), len(not_used_index_benefits))
         if self.try_variations_max_removals > min_length:
             self.try_variations_max_removals = min_length
 
         if self.try_variations_max_removals == 0:
-            return selected_index_benefits
+            return set(selected_index_benefits)
 
         current_cost = self._evaluate_workload(selected_index_benefits, workload)
+        current_size = sum(
+            index_benefit.size() for index_benefit in selected_index_benefits
+        )
+        current_benefit = sum(
+            index_benefit.benefit for index_benefit in selected_index_benefits
+        )
         logging.debug(f"Initial cost \t{current_cost}")
-        selected_index_benefits_set = set(selected_index_benefits)
+        best_cost = current_cost
+        best_index_benefits = selected_index_benefits
+        variations_without_improvement = 0
+        # Restarting is pointless if all candidates fit into the budget because every
+        # greedy selection would contain all of them.
+        restarts_enabled = self.try_variations_patience is not None and (
+            current_size
+            + sum(index_benefit.size() for index_benefit in not_used_index_benefits)
+            > self.disk_constraint
+        )
 
         while start_time + self.try_variations_seconds > time.time():
+            if (
+                restarts_enabled
+                and variations_without_improvement >= 2 * self.try_variations_patience
+            ):
+                logging.debug("Restart TryVariations from a perturbed greedy selection")
+                (
+                    selected_index_benefits,
+                    not_used_index_benefits,
+                ) = self._perturbed_greedy_selection(
+                    selected_index_benefits + not_used_index_benefits
+                )
+                current_cost = self._evaluate_workload(selected_index_benefits, workload)
+                current_size = sum(
+                    index_benefit.size() for index_benefit in selected_index_benefits
+                )
+                current_benefit = sum(
+                    index_benefit.benefit for index_benefit in selected_index_benefits
+                )
+                variations_without_improvement = 0
+                if current_cost < best_cost:
+                    best_cost = current_cost
+                    best_index_benefits = selected_index_benefits
+
             number_of_exchanges = (
                 random.randrange(1, self.try_variations_max_removals)
                 if self.try_variations_max_removals > 1
                 else 1
             )
-            indexes_to_remove = frozenset(
-                random.sample(list(selected_index_benefits_set), k=number_of_exchanges)
+            # Widen the neighborhood if the current selection stagnates
+            if self.try_variations_patience is not None:
+                number_of_exchanges *= (
+                    1 + variations_without_improvement // self.try_variations_patience
+                )
+            # Accepted variations can shrink the selection if added indexes did not
+            # fit into the budget.
+            number_of_exchanges = min(
+                number_of_exchanges,
+                len(selected_index_benefits),
+                len(not_used_index_benefits),
             )
-
-            new_variaton = set(selected_index_benefits_set - indexes_to_remove)
-            new_variation_size = sum(
-                [index_benefit.size() for index_benefit in new_variaton]
+            if number_of_exchanges == 0:
+                break
+
+            # Positions are sampled instead of index benefits. Thereby, sampled
+            # elements can be removed in constant time by swapping them with the
+            # last element of the respective list.
+            positions_to_remove = _sample_positions(
+                len(selected_index_benefits), number_of_exchanges
+            )
+            indexes_to_remove = [
+                selected_index_benefits[position] for position in positions_to_remove
+            ]
+            new_variation_size = current_size - sum(
+                index_benefit.size() for index_benefit in indexes_to_remove
+            )
+            new_variation_benefit = current_benefit - sum(
+                index_benefit.benefit for index_benefit in indexes_to_remove
             )
 
-            indexes_to_add = random.sample(
-                list(not_used_index_benefits), k=number_of_exchanges
+            positions_to_add = _sample_positions(
+                len(not_used_index_benefits), number_of_exchanges
             )
-            assert len(indexes_to_add) == len(
-                indexes_to_remove
-            ), "_try_variations must remove the same number of indexes that are added."
-            for index_benefit in indexes_to_add:
+            positions_added = []
+            for position in positions_to_add:
+                index_benefit = not_used_index_benefits[position]
                 if index_benefit.size() + new_variation_size > self.disk_constraint:
                     continue
-                new_variaton.add(index_benefit)
+                positions_added.append(position)
                 new_variation_size += index_benefit.size()
+                new_variation_benefit += index_benefit.benefit
+
+            # The summed benefits of the individual indexes serve as cheap estimate
+            # for the variation's quality. Clearly worse variations are skipped
+            # without requesting their cost.
+            if self._discard_variation(new_variation_benefit, current_benefit):
+                variations_without_improvement += 1
+                continue
+
+            new_variation = selected_index_benefits.copy()
+            _swap_remove(new_variation, positions_to_remove)
+            new_variation.extend(
+                not_used_index_benefits[position] for position in positions_added
+            )
+
+            cost_of_variation = self._evaluate_workload(new_variation, workload)
 
-            cost_of_variation = self._evaluate_workload(new_variaton, workload)
+            if cost_of_variation >= current_cost:
+                variations_without_improvement += 1
+                continue
 
-            if cost_of_variation < current_cost:
-                logging.debug(f"Lower cost found \t{current_cost}")
-                current_cost = cost_of_variation
-                selected_index_benefits_set = new_variaton
+            logging.debug(f"Lower cost found \t{cost_of_variation}")
+            current_cost = cost_of_variation
+            current_size = new_variation_size
+            current_benefit = new_variation_benefit
+            selected_index_benefits = new_variation
+            _swap_remove(not_used_index_benefits, positions_added)
+            not_used_index_benefits.extend(indexes_to_remove)
+            variations_without_improvement = 0
+            if current_cost < best_cost:
+                best_cost = current_cost
+                best_index_benefits = selected_index_benefits
+
+        return set(best_index_benefits)
+
+    def _discard_variation(self, variation_benefit, current_benefit):
+        if self.try_variations_benefit_tolerance is None:
+            return False
+        tolerance = abs(current_benefit) * self.try_variations_benefit_tolerance
+        return variation_benefit < current_benefit - tolerance
+
+    # Greedily fills the budget after randomly scaling each benefit/size ratio by up to
+    # RESTART_PERTURBATION. Thereby, restarts stay close to the greedy selection but
+    # explore different tie-breaks and trade-offs.
+    # Returns the selected and the remaining index benefits.
+    def _perturbed_greedy_selection(self, index_benefits):
+        index_benefits = sorted(
+            index_benefits,
+            key=lambda index_benefit: index_benefit.benefit_size_ratio()
+            * random.uniform(1 - RESTART_PERTURBATION, 1 + RESTART_PERTURBATION),
+            reverse=True,
+        )
+        selected_index_benefits = self._greedy_selection(index_benefits)
+        selected = set(selected_index_benefits)
+        not_used_index_benefits = [
+            index_benefit
+            for index_benefit in index_benefits
+            if index_benefit not in selected
+        ]
 
-        return selected_index_benefits_set
+        return selected_index_benefits, not_used_index_benefits
 
     def _evaluate_workload(self, index_benefits, workload):
         index_candidates = [index_benefit.index for index_benefit in index_benefits]
-        return self.cost_evaluation.calculate_cost(workload, index_candidates)
+        cache_key = frozenset(index_candidates)
+        if cache_key in self.workload_cost_cache:
+            self.workload_cost_cache.move_to_end(cache_key)
+            return self.workload_cost_cache[cache_key]
+
+        cost = self.cost_evaluation.calculate_cost(workload, index_candidates)
+        self.workload_cost_cache[cache_key] = cost
+        if len(self.workload_cost_cache) > WORKLOAD_COST_CACHE_SIZE:
+            self.workload_cost_cache.popitem(last=False)
+        return cost
+
+
+# Draws k distinct positions of a list with the given length. Single positions, the
+# most frequent case in TryVariations, skip the setup costs of random.sample.
+def _sample_positions(length, k):
+    if k == 1:
+        return [random.randrange(length)]
+    return random.sample(range(length), k)
+
+
+# Removes the elements at the given positions from the list in O(len(positions)) by
+# replacing each of them with the list's last element. The order of the remaining
+# elements is not preserved.
+def _swap_remove(elements, positions):
+    # Descending positions ensure that no element which still has to be removed is
+    # moved to another position.
+    for position in sorted(positions, reverse=True):
+        elements[position] = elements[-1]
+        elements.pop()
 
 
 class IndexBenefit:
+    # Many instances are created, one per candidate. Slots avoid a per-instance dict.
+    __slots__ = ("index", "benefit")
+
     def __init__(self, index, benefit):
         self.index = index
         self.benefit = benefit
@@ -212,3 +559,8 @@ class IndexBenefit:
 
     def benefit_size_ratio(self):
         return self.benefit / self.size()
+
+    # Sorting by this key is equivalent to sorting via __lt__. However, the ratio is
+    # only computed once per element instead of twice per comparison.
+    def sort_key(self):
+        return (self.benefit_size_ratio(), self.index)
@@ -26,13 +26,16 @@ def syntactically_relevant_indexes(query, max_index_width):
             indexable_columns_per_table[column.table] = set()
         indexable_columns_per_table[column.table].add(column)
 
-    possible_column_combinations = set()
-    for table in indexable_columns_per_table:
-        columns = indexable_columns_per_table[table]
-        for index_length in range(1, max_index_width + 1):
-            possible_column_combinations |= set(
-                itertools.permutations(columns, index_length)
+    # Permutations of distinct columns are distinct and indexes can only contain
+    # columns of a single table. Hence, no deduplication is required.
+    possible_indexes = []
+    for table_columns in indexable_columns_per_table.values():
+        table_columns = sorted(table_columns)
+        for index_length in range(1, min(max_index_width, len(table_columns)) + 1):
+            possible_indexes.extend(
+                Index(permutation)
+                for permutation in itertools.permutations(table_columns, index_length)
             )
 
-    logging.debug(f"Potential indexes: {len(possible_column_combinations)}")
-    return [Index(p) for p in possible_column_combinations]
+    logging.debug(f"Potential indexes: {len(possible_indexes)}")
+    return possible_indexes
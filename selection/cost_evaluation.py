@@ -42,7 +42,7 @@ class CostEvaluation:
 
         plan = self.db_connector.get_plan(query)
         cost = plan["Total Cost"]
-        plan_str = str(plan)
+        utilized_index_names = self._utilized_index_names(plan)
 
         recommended_indexes = set()
 
@@ -57,12 +57,25 @@ class CostEvaluation:
                 index in indexes
             ), "Something went wrong with _prepare_cost_calculation."
 
-            if index.hypopg_name not in plan_str:
+            if index.hypopg_name not in utilized_index_names:
                 continue
             recommended_indexes.add(index)
 
         return recommended_indexes, cost
 
+    # Collects the names of all indexes that are used by any node of the plan
+    @staticmethod
+    def _utilized_index_names(plan):
+        index_names = set()
+        plan_nodes = [plan]
+        while plan_nodes:
+            plan_node = plan_nodes.pop()
+            if "Index Name" in plan_node:
+                index_names.add(plan_node["Index Name"])
+            plan_nodes.extend(plan_node.get("Plans", []))
+
+        return index_names
+
     def calculate_cost(self, workload, indexes, store_size=False):
         assert (
             self.completed is False
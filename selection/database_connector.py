@@ -18,8 +18,10 @@ class DatabaseConnector:
     def exec_only(self, statement):
         self._cursor.execute(statement)
 
-    def exec_fetch(self, statement, one=True):
-        self._cursor.execute(statement)
+    # Values passed via `parameters` are bound by the database driver and must not be
+    # interpolated into `statement`.
+    def exec_fetch(self, statement, one=True, parameters=None):
+        self._cursor.execute(statement, parameters)
         if one:
             return self._cursor.fetchone()
         return self._cursor.fetchall()
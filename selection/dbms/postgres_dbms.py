@@ -132,7 +132,8 @@ class PostgresDatabaseConnector(DatabaseConnector):
         )
         self.exec_only(statement)
         size = self.exec_fetch(
-            f"select relpages from pg_class c " f"where c.relname = '{index.index_idx()}'"
+            "select relpages from pg_class c where c.relname = %s",
+            parameters=(index.index_idx(),),
         )
         size = size[0]
         index.estimated_size = size * 8 * 1024
@@ -169,8 +170,8 @@ class PostgresDatabaseConnector(DatabaseConnector):
         self._cleanup_query(query)
         return result
 
-    def exec_fetchall(self, query):
-        self._cursor.execute(query)
+    def exec_fetchall(self, query, parameters=None):
+        self._cursor.execute(query, parameters)
         return self._cursor.fetchall()
 
     def _cleanup_query(self, query):
@@ -198,17 +199,17 @@ class PostgresDatabaseConnector(DatabaseConnector):
         return result[0]
 
     def table_exists(self, table_name):
-        statement = f"""SELECT EXISTS (
+        statement = """SELECT EXISTS (
             SELECT 1
             FROM pg_tables
-            WHERE tablename = '{table_name}');"""
-        result = self.exec_fetch(statement)
+            WHERE tablename = %s);"""
+        result = self.exec_fetch(statement, parameters=(table_name,))
         return result[0]
 
     def database_exists(self, database_name):
-        statement = f"""SELECT EXISTS (
+        statement = """SELECT EXISTS (
             SELECT 1
             FROM pg_database
-            WHERE datname = '{database_name}');"""
-        result = self.exec_fetch(statement)
+            WHERE datname = %s);"""
+        result = self.exec_fetch(statement, parameters=(database_name,))
         return result[0]
@@ -10,6 +10,9 @@ class Index:
         # Store hypopg estimated size when `store_size=True` (whatif)
         self.estimated_size = estimated_size
         self.hypopg_name = None
+        # Indexes are frequently used in sets and as dictionary keys. Since the
+        # columns do not change, the hash is computed once on first use.
+        self._hash = None
 
     # Used to sort indexes
     def __lt__(self, other):
@@ -29,7 +32,19 @@ class Index:
         return self.columns == other.columns
 
     def __hash__(self):
-        return hash(self.columns)
+        if self._hash is None:
+            self._hash = hash(self.columns)
+        return self._hash
+
+    # String hashes differ between processes. Hence, the cached hash is not pickled.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_hash"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._hash = None
 
     def _column_names(self):
         return [x.name for x in self.columns]
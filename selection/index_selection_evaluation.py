@@ -66,7 +66,10 @@ class IndexSelection:
             # use a custom workload on existing an existing database
             self.database_name = config["database_name"]
             workload_parser = WorkloadParser(
-                self.database_system, self.database_name, config["benchmark_name"]
+                self.database_system,
+                self.database_name,
+                config["benchmark_name"],
+                config.get("workload_cache_directory"),
             )
             self.workload = workload_parser.execute()
             self.setup_db_connector(self.database_name, self.database_system)
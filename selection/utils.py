@@ -34,24 +34,74 @@ def indexes_by_table(indexes):
 def get_utilized_indexes(
     workload, indexes_per_query, cost_evaluation, detailed_query_information=False
 ):
+    # Equal candidates of different queries are replaced by a single index object.
+    # Thereby, information gathered during the index simulation, e.g., the estimated
+    # size, is reused for all queries.
+    unique_indexes = {}
+    indexes_per_query = [
+        [unique_indexes.setdefault(index, index) for index in indexes]
+        for indexes in indexes_per_query
+    ]
+
+    # Indexes that are not relevant for the current query are unsimulated by the cost
+    # evaluation. Queries on the same tables share many candidates. Processing them
+    # consecutively keeps shared candidates simulated and avoids re-simulations.
+    queries_and_indexes = sorted(
+        zip(workload.queries, indexes_per_query),
+        key=lambda query_and_indexes: sorted(
+            {index.table().name for index in query_and_indexes[1]}
+        ),
+    )
+
+    # Requesting costs without indexes unsimulates all indexes. Therefore, these costs
+    # are requested for all queries first and not in between the analyses of queries
+    # that share candidates.
+    # Structure: {query text: cost without indexes}
+    costs_without_indexes = {}
+    if detailed_query_information:
+        for query in workload.queries:
+            if query.text not in costs_without_indexes:
+                costs_without_indexes[query.text] = cost_evaluation.calculate_cost(
+                    Workload([query]), indexes=[]
+                )
+
     utilized_indexes_workload = set()
-    query_details = {}
-    for query, indexes in zip(workload.queries, indexes_per_query):
-        (
-            utilized_indexes_query,
-            cost_with_indexes,
-        ) = cost_evaluation.which_indexes_utilized_and_cost(query, indexes)
+    details_per_query = {}
+    # Queries with equal texts and candidates yield equal results. Hence, each of
+    # them is only analyzed once.
+    # Structure: {(query text, candidates): (utilized indexes, cost with indexes)}
+    analyzed_queries = {}
+    for query, indexes in queries_and_indexes:
+        cost_without_indexes = costs_without_indexes.get(query.text)
+        analysis_key = (query.text, frozenset(indexes))
+        if analysis_key in analyzed_queries:
+            utilized_indexes_query, cost_with_indexes = analyzed_queries[analysis_key]
+            utilized_indexes_query = set(utilized_indexes_query)
+        elif indexes:
+            (
+                utilized_indexes_query,
+                cost_with_indexes,
+            ) = cost_evaluation.which_indexes_utilized_and_cost(query, indexes)
+            analyzed_queries[analysis_key] = (utilized_indexes_query, cost_with_indexes)
+        else:
+            # Without candidates, no index can be utilized. There is no need to
+            # simulate indexes and request the query plan.
+            utilized_indexes_query = set()
+            cost_with_indexes = cost_without_indexes
         utilized_indexes_workload |= utilized_indexes_query
 
         if detailed_query_information:
-            cost_without_indexes = cost_evaluation.calculate_cost(
-                Workload([query]), indexes=[]
-            )
-
-            query_details[query] = {
+            details_per_query[query] = {
                 "cost_without_indexes": cost_without_indexes,
                 "cost_with_indexes": cost_with_indexes,
                 "utilized_indexes": utilized_indexes_query,
             }
 
+    # Details are returned in workload order independent of the processing order
+    query_details = {
+        query: details_per_query[query]
+        for query in workload.queries
+        if query in details_per_query
+    }
+
     return utilized_indexes_workload, query_details
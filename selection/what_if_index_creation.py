@@ -20,7 +20,8 @@ class WhatIfIndexCreation:
         potential_index.hypopg_name = index_name
         potential_index.hypopg_oid = index_oid
 
-        if store_size:
+        # The size of an index does not change if it is simulated again
+        if store_size and potential_index.estimated_size is None:
             potential_index.estimated_size = self.estimate_index_size(index_oid)
 
     def drop_simulated_index(self, index):
@@ -1,15 +1,25 @@
-import glob
+import hashlib
+import logging
 import os
+import pathlib
+import pickle
+from concurrent.futures import ThreadPoolExecutor
 
 from selection.workload import Column, Query, Table, Workload
 from selection.dbms.postgres_dbms import PostgresDatabaseConnector
 
 
 class WorkloadParser:
-    def __init__(self, database_system, database_name, benchmark_name):
+    # If `cache_directory` is set, parsed workloads are cached there. The cache is
+    # invalidated if the database's tables and columns or the workload's query files
+    # change.
+    def __init__(
+        self, database_system, database_name, benchmark_name, cache_directory=None
+    ):
         self.database_system = database_system
         self.database_name = database_name
         self.benchmark_name = benchmark_name
+        self.cache_directory = cache_directory
 
     @staticmethod
     def is_custom_workload(benchmark_name):
@@ -22,26 +32,26 @@ class WorkloadParser:
     def get_tables(self):
         assert self.database_system == "postgres"
         db_connector = PostgresDatabaseConnector(self.database_name)
+        # Retrieve the columns of all tables with a single query instead of one
+        # query per table
         result = db_connector.exec_fetchall(
-            "SELECT tablename FROM pg_catalog.pg_tables WHERE schemaname='public';"
+            "SELECT table_name, column_name "
+            + "FROM information_schema.columns "
+            + "WHERE table_schema = %(schema)s "
+            + "AND table_name IN "
+            + "(SELECT tablename FROM pg_catalog.pg_tables "
+            + "WHERE schemaname = %(schema)s) "
+            + "ORDER BY table_name, ordinal_position;",
+            {"schema": "public"},
         )
-        table_names = [row[0] for row in result]
+        db_connector.close()
 
         tables = {}
 
-        for table_name in table_names:
-            table = Table(table_name)
-            result = db_connector.exec_fetchall(
-                "SELECT column_name "
-                + "FROM information_schema.columns "
-                + "WHERE table_schema = 'public' "
-                + f"AND table_name = '{table_name}';"
-            )
-            column_names = [row[0] for row in result]
-            for column_name in column_names:
-                table.add_column(Column(column_name))
-
-            tables[table_name] = table
+        for table_name, column_name in result:
+            if table_name not in tables:
+                tables[table_name] = Table(table_name)
+            tables[table_name].add_column(Column(column_name))
 
         return tables
 
@@ -55,22 +65,53 @@ class WorkloadParser:
 
     def execute(self):
         file_path = os.path.dirname(os.path.abspath(__file__))
-        query_files = glob.glob(
-            f"{file_path}/../custom_workloads/{self.benchmark_name}/*.sql"
+        workload_directory = pathlib.Path(
+            file_path, "..", "custom_workloads", self.benchmark_name
         )
-        query_files.sort()
+        query_files = sorted(workload_directory.glob("*.sql"))
 
         # Retrieve schema to search for indexable columns
         tables = self.get_tables()
 
+        if self.cache_directory:
+            cache_file = self._cache_file(query_files, tables)
+            if os.path.exists(cache_file):
+                logging.debug(f"Load parsed workload from {cache_file}")
+                with open(cache_file, "rb") as f:
+                    return pickle.load(f)
+
+        # Reading the files is I/O bound, hence, they are read concurrently
+        with ThreadPoolExecutor() as executor:
+            query_texts = list(executor.map(pathlib.Path.read_text, query_files))
+
         queries = []
 
-        for file_name in query_files:
-            with open(file_name) as f:
-                query_text = f.read()
-                query_id = file_name.split("/")[-1]
-                query = Query(query_id, query_text)
-                self.store_indexable_columns(query, tables)
-                queries.append(query)
+        for query_file, query_text in zip(query_files, query_texts):
+            query = Query(query_file.name, query_text)
+            self.store_indexable_columns(query, tables)
+            queries.append(query)
+
+        workload = Workload(queries)
 
-        return Workload(queries)
+        if self.cache_directory:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            with open(cache_file, "wb") as f:
+                pickle.dump(workload, f)
+
+        return workload
+
+    def _cache_file(self, query_files, tables):
+        fingerprint = hashlib.sha256(self.database_name.encode())
+        for table_name, table in tables.items():
+            column_names = ",".join(column.name for column in table.columns)
+            fingerprint.update(f"{table_name}:{column_names};".encode())
+        for query_file in query_files:
+            file_stat = query_file.stat()
+            fingerprint.update(
+                f"{query_file.name}:{file_stat.st_mtime_ns}:{file_stat.st_size}".encode()
+            )
+
+        return os.path.join(
+            self.cache_directory,
+            f"{self.benchmark_name}_{fingerprint.hexdigest()}.pickle",
+        )
@@ -57,6 +57,7 @@ class TestCandidateGeneration(unittest.TestCase):
 
         result = syntactically_relevant_indexes(query_1, max_index_width=3)
         self.assertEqual(len(result), 15)
+        self.assertEqual(len(set(result)), len(result))
 
     def test_candidates_per_query(self):
         MAX_INDEX_WIDTH = 2
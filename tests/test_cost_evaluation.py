@@ -79,6 +79,27 @@ class TestCostEvaluation(unittest.TestCase):
         )
         self.assertEqual(result, frozenset([index_1, index_0]))
 
+    def test_utilized_index_names(self):
+        plan = {
+            "Node Type": "Nested Loop",
+            "Total Cost": 17,
+            "Plans": [
+                {"Node Type": "Index Scan", "Index Name": "<1>btree_a_col0"},
+                {
+                    "Node Type": "Bitmap Heap Scan",
+                    "Plans": [
+                        {"Node Type": "Bitmap Index Scan", "Index Name": "<2>btree_a"}
+                    ],
+                },
+                {"Node Type": "Seq Scan", "Filter": "(col1 = '<3>btree_a_col1')"},
+            ],
+        }
+        result = self.cost_evaluation._utilized_index_names(plan)
+        self.assertEqual(result, {"<1>btree_a_col0", "<2>btree_a"})
+
+        result = self.cost_evaluation._utilized_index_names({"Total Cost": 17})
+        self.assertEqual(result, set())
+
     def test_cost_requests(self):
         self.assertEqual(self.cost_evaluation.cost_requests, 0)
 
@@ -1,12 +1,18 @@
 import time
 import unittest
-from unittest.mock import MagicMock
-
-from selection.algorithms.db2advis_algorithm import DB2AdvisAlgorithm, IndexBenefit
+from unittest.mock import MagicMock, patch
+
+from selection.algorithms.db2advis_algorithm import (
+    DB2AdvisAlgorithm,
+    IndexBenefit,
+    _sample_positions,
+    _swap_remove,
+)
 from selection.dbms.postgres_dbms import PostgresDatabaseConnector
 from selection.index import Index
 from selection.query_generator import QueryGenerator
 from selection.table_generator import TableGenerator
+from selection.utils import mb_to_b
 from selection.workload import Column, Query, Table, Workload
 
 
@@ -21,6 +27,18 @@ class MockConnector:
         pass
 
 
+class MockStatisticsConnector(MockConnector):
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.simulated_indexes = 1
+        self.cost_estimations = 2
+        self.cost_estimation_duration = 3
+        self.index_simulation_duration = 4
+
+    def close(self):
+        pass
+
+
 MB_TO_BYTES = 1000000
 
 
@@ -88,6 +106,15 @@ class TestDB2AdvisAlgorithm(unittest.TestCase):
         )
         # query_1 = Query(1, 'SELECT * FROM TableA WHERE ColA = 4;', [self.column_0])
 
+    # Creates single-column index benefits with the given sizes and benefits
+    def _index_benefits(self, sizes, benefits):
+        index_benefits = []
+        for column, size, benefit in zip(self.all_columns, sizes, benefits):
+            index = Index([column])
+            index.estimated_size = size
+            index_benefits.append(IndexBenefit(index, benefit))
+        return index_benefits
+
     def test_db2advis_algorithm(self):
         # Should use default parameters if none are specified
         budget_in_mb = 500
@@ -95,6 +122,15 @@ class TestDB2AdvisAlgorithm(unittest.TestCase):
         self.assertEqual(self.algo.cost_evaluation.cost_estimation, "whatif")
         self.assertEqual(self.algo.try_variations_seconds, 10)
         self.assertEqual(self.algo.try_variations_max_removals, 4)
+        self.assertEqual(self.algo.try_variations_benefit_tolerance, None)
+        self.assertEqual(self.algo.try_variations_patience, None)
+        self.assertEqual(self.algo.initial_selection, "greedy")
+
+        with self.assertRaises(AssertionError):
+            DB2AdvisAlgorithm(
+                database_connector=self.connector,
+                parameters={"try_variations_patience": 0},
+            )
 
     def test_index_benefit__lt__(self):
         index_0 = Index([self.column_0])
@@ -111,6 +147,15 @@ class TestDB2AdvisAlgorithm(unittest.TestCase):
         index_benefit_1 = IndexBenefit(index_1, 20)
         self.assertTrue(index_benefit_0 < index_benefit_1)
 
+    def test_index_benefit_sort_key(self):
+        index_benefits = self._index_benefits([1, 2, 1, 4, 2], [10, 20, 5, 40, 30])
+
+        # Ties in the ratio are broken by the index like in __lt__
+        self.assertEqual(
+            sorted(index_benefits, key=IndexBenefit.sort_key, reverse=True),
+            sorted(index_benefits, reverse=True),
+        )
+
     def test_calculate_index_benefits(self):
         index_0 = Index([self.column_0])
         index_0.estimated_size = 5
@@ -229,6 +274,45 @@ class TestDB2AdvisAlgorithm(unittest.TestCase):
             [], [index_0, index_1]
         )
 
+    def test_evaluate_workload_cached(self):
+        index_0 = Index([self.column_0])
+        index_1 = Index([self.column_1])
+        self.algo.cost_evaluation.calculate_cost = MagicMock(return_value=17)
+
+        cost = self.algo._evaluate_workload(
+            [IndexBenefit(index_0, 10), IndexBenefit(index_1, 9)], workload=[]
+        )
+        self.assertEqual(cost, 17)
+        # The same configuration in a different order must hit the cache
+        cost = self.algo._evaluate_workload(
+            [IndexBenefit(index_1, 9), IndexBenefit(index_0, 10)], workload=[]
+        )
+        self.assertEqual(cost, 17)
+        self.assertEqual(self.algo.cost_evaluation.calculate_cost.call_count, 1)
+
+        self.algo._evaluate_workload([IndexBenefit(index_0, 10)], workload=[])
+        self.assertEqual(self.algo.cost_evaluation.calculate_cost.call_count, 2)
+
+    @patch("selection.algorithms.db2advis_algorithm.WORKLOAD_COST_CACHE_SIZE", 2)
+    def test_evaluate_workload_cache_eviction(self):
+        index_benefit_0 = IndexBenefit(Index([self.column_0]), 10)
+        index_benefit_1 = IndexBenefit(Index([self.column_1]), 9)
+        index_benefit_2 = IndexBenefit(Index([self.column_2]), 8)
+        self.algo.cost_evaluation.calculate_cost = MagicMock(return_value=17)
+
+        self.algo._evaluate_workload([index_benefit_0], workload=[])
+        self.algo._evaluate_workload([index_benefit_1], workload=[])
+        # Accessing the first configuration makes the second one least recently used
+        self.algo._evaluate_workload([index_benefit_0], workload=[])
+        self.algo._evaluate_workload([index_benefit_2], workload=[])
+        self.assertEqual(self.algo.cost_evaluation.calculate_cost.call_count, 3)
+        self.assertEqual(len(self.algo.workload_cost_cache), 2)
+
+        self.algo._evaluate_workload([index_benefit_0], workload=[])
+        self.assertEqual(self.algo.cost_evaluation.calculate_cost.call_count, 3)
+        self.algo._evaluate_workload([index_benefit_1], workload=[])
+        self.assertEqual(self.algo.cost_evaluation.calculate_cost.call_count, 4)
+
     def test_try_variations_time_limit(self):
         index_0 = Index([self.column_0])
         index_0.estimated_size = 1
@@ -312,3 +396,267 @@ class TestDB2AdvisAlgorithm(unittest.TestCase):
             workload=[],
         )
         self.assertEqual(new, set([IndexBenefit(index_0, 1)]))
+
+    def test_try_variations_reuses_removed_indexes(self):
+        index_0 = Index([self.column_0])
+        index_0.estimated_size = 1
+        index_1 = Index([self.column_1])
+        index_1.estimated_size = 1
+        index_2 = Index([self.column_2])
+        index_2.estimated_size = 1
+        index_benefit_0 = IndexBenefit(index_0, 1)
+        index_benefit_1 = IndexBenefit(index_1, 1)
+        index_benefit_2 = IndexBenefit(index_2, 1)
+
+        # Depending on the first exchange, the optimum {index_0, index_2} can only
+        # be reached if index_0 returns to the pool of unused indexes.
+        def fake(selected, workload):
+            selected = set(selected)
+            if selected == {index_benefit_0, index_benefit_2}:
+                return 5
+            if selected == {index_benefit_1, index_benefit_2}:
+                return 8
+            return 10
+
+        self.algo._evaluate_workload = fake
+        self.algo.try_variations_seconds = 0.1
+        self.algo.try_variations_max_removals = 1
+        self.algo.disk_constraint = 2
+        new = self.algo._try_variations(
+            selected_index_benefits=[index_benefit_0, index_benefit_1],
+            index_benefits=[index_benefit_0, index_benefit_1, index_benefit_2],
+            workload=[],
+        )
+        self.assertEqual(new, {index_benefit_0, index_benefit_2})
+
+    def test_discard_variation(self):
+        self.algo.try_variations_benefit_tolerance = 0.1
+        self.assertFalse(self.algo._discard_variation(12, 10))
+        self.assertFalse(self.algo._discard_variation(9.5, 10))
+        self.assertTrue(self.algo._discard_variation(8, 10))
+        self.assertFalse(self.algo._discard_variation(-10.5, -10))
+        self.assertTrue(self.algo._discard_variation(-12, -10))
+
+        self.algo.try_variations_benefit_tolerance = None
+        self.assertFalse(self.algo._discard_variation(0, 10))
+
+    def test_try_variations_skips_discarded_variations(self):
+        index_0 = Index([self.column_0])
+        index_0.estimated_size = 1
+        index_1 = Index([self.column_1])
+        index_1.estimated_size = 1
+        self.algo.cost_evaluation.calculate_cost = MagicMock(return_value=17)
+        self.algo.try_variations_seconds = 0.1
+        self.algo.try_variations_benefit_tolerance = 0.1
+
+        # Exchanging index_0 for index_1 is never worth requesting the cost
+        new = self.algo._try_variations(
+            selected_index_benefits=[IndexBenefit(index_0, 10)],
+            index_benefits=[IndexBenefit(index_0, 10), IndexBenefit(index_1, 1)],
+            workload=[],
+        )
+        self.assertEqual(new, {IndexBenefit(index_0, 10)})
+        self.algo.cost_evaluation.calculate_cost.assert_called_once()
+
+    def test_perturbed_greedy_selection(self):
+        # The perturbation cannot outweigh the much higher benefit/size ratio of the
+        # last index
+        index_benefits = self._index_benefits([1] * 8, [1] * 7 + [100])
+        self.algo.disk_constraint = 3
+
+        selected, not_used = self.algo._perturbed_greedy_selection(index_benefits)
+        self.assertEqual(len(selected), 3)
+        self.assertIn(index_benefits[-1], selected)
+        self.assertEqual(len(not_used), len(index_benefits) - 3)
+        self.assertEqual(set(selected) | set(not_used), set(index_benefits))
+
+    def test_try_variations_widens_neighborhood(self):
+        index_benefits = self._index_benefits([1] * 4, [1] * 4)
+        self.algo._evaluate_workload = MagicMock(return_value=10)
+        self.algo.try_variations_seconds = 0.05
+        self.algo.try_variations_max_removals = 2
+        self.algo.try_variations_benefit_tolerance = None
+        self.algo.try_variations_patience = 1
+        self.algo.disk_constraint = 2
+
+        with patch(
+            "selection.algorithms.db2advis_algorithm._sample_positions",
+            wraps=_sample_positions,
+        ) as sample_mock:
+            self.algo._try_variations(
+                selected_index_benefits=index_benefits[:2],
+                index_benefits=index_benefits,
+                workload=[],
+            )
+        # Single exchanges until the first variation did not improve the cost
+        exchanges = [call.args[1] for call in sample_mock.call_args_list]
+        self.assertEqual(exchanges[:2], [1, 1])
+        self.assertEqual(exchanges[2:4], [2, 2])
+
+    def test_try_variations_discarded_variations_stagnate(self):
+        index_benefits = self._index_benefits([1] * 4, [10, 10, 1, 1])
+        self.algo._evaluate_workload = MagicMock(return_value=10)
+        self.algo.try_variations_seconds = 0.05
+        self.algo.try_variations_max_removals = 2
+        self.algo.try_variations_benefit_tolerance = 0.1
+        self.algo.try_variations_patience = 1
+        self.algo.disk_constraint = 2
+
+        with patch(
+            "selection.algorithms.db2advis_algorithm._sample_positions",
+            wraps=_sample_positions,
+        ) as sample_mock:
+            new = self.algo._try_variations(
+                selected_index_benefits=index_benefits[:2],
+                index_benefits=index_benefits,
+                workload=[],
+            )
+        # All variations are discarded, but still widen the neighborhood
+        exchanges = [call.args[1] for call in sample_mock.call_args_list]
+        self.assertEqual(exchanges[:4], [1, 1, 2, 2])
+        self.assertEqual(new, set(index_benefits[:2]))
+
+    @patch("selection.algorithms.db2advis_algorithm.get_utilized_indexes")
+    def test_get_utilized_indexes_parallel(self, get_utilized_indexes_mock):
+        def get_utilized_indexes_fake(workload, candidates, cost_evaluation, detailed):
+            utilized_indexes = set()
+            query_details = {}
+            for query, indexes in zip(workload.queries, candidates):
+                utilized_indexes |= set(indexes)
+                query_details[query] = {"utilized_indexes": set(indexes)}
+            return utilized_indexes, query_details
+
+        get_utilized_indexes_mock.side_effect = get_utilized_indexes_fake
+        connector = MockStatisticsConnector("test_db")
+        algo = DB2AdvisAlgorithm(connector, {"utilized_indexes_workers": 2})
+
+        queries = [Query(i, f"SELECT * FROM Table0 WHERE Col{i} = 1;") for i in range(3)]
+        workload = Workload(queries)
+        candidates = [[Index([column])] for column in self.all_columns[:3]]
+
+        utilized_indexes, query_details = algo._get_utilized_indexes_parallel(
+            workload, candidates
+        )
+        self.assertEqual(get_utilized_indexes_mock.call_count, 2)
+        self.assertEqual(
+            utilized_indexes, {index for indexes in candidates for index in indexes}
+        )
+        self.assertEqual(list(query_details.keys()), queries)
+        self.assertEqual(
+            query_details[queries[2]]["utilized_indexes"], set(candidates[2])
+        )
+
+        # Statistics of both workers are added to the algorithm's connector
+        self.assertEqual(connector.simulated_indexes, 3)
+        self.assertEqual(connector.cost_estimations, 6)
+        self.assertEqual(connector.cost_estimation_duration, 9)
+        self.assertEqual(connector.index_simulation_duration, 12)
+
+        # Queries that create views are analyzed by the same worker
+        get_utilized_indexes_mock.reset_mock()
+        view_text = "create view revenue0 as SELECT 1; SELECT * FROM revenue0;"
+        queries = [Query(i, view_text) for i in range(3)]
+        algo._get_utilized_indexes_parallel(Workload(queries), candidates)
+        self.assertEqual(get_utilized_indexes_mock.call_count, 1)
+        self.assertEqual(get_utilized_indexes_mock.call_args[0][0].queries, queries)
+
+    @patch("selection.algorithms.db2advis_algorithm.get_utilized_indexes")
+    def test_get_utilized_indexes_parallel_empty_workload(
+        self, get_utilized_indexes_mock
+    ):
+        get_utilized_indexes_mock.return_value = (set(), {})
+        algo = DB2AdvisAlgorithm(self.connector, {"utilized_indexes_workers": 2})
+
+        # Falls back to the serial analysis with the algorithm's cost evaluation
+        self.assertEqual(
+            algo._get_utilized_indexes_parallel(Workload([]), []), (set(), {})
+        )
+        get_utilized_indexes_mock.assert_called_once()
+        self.assertEqual(
+            get_utilized_indexes_mock.call_args[0][1:], ([], algo.cost_evaluation, True)
+        )
+
+    def test_initial_selection(self):
+        index_0 = Index([self.column_0])
+        index_0.estimated_size = 3
+        index_1 = Index([self.column_1])
+        index_1.estimated_size = 2
+        index_2 = Index([self.column_2])
+        index_2.estimated_size = 2
+        index_benefit_0 = IndexBenefit(index_0, 4)
+        index_benefit_1 = IndexBenefit(index_1, 2.5)
+        index_benefit_2 = IndexBenefit(index_2, 2.4)
+        index_benefits = [index_benefit_0, index_benefit_1, index_benefit_2]
+        self.algo.disk_constraint = 4
+
+        # Greedily choosing the index with the best ratio blocks the budget
+        self.assertEqual(self.algo._greedy_selection(index_benefits), [index_benefit_0])
+        self.assertEqual(
+            self.algo._knapsack_selection(index_benefits),
+            [index_benefit_1, index_benefit_2],
+        )
+        # The greedy selection is used by default
+        self.assertEqual(self.algo._initial_selection(index_benefits), [index_benefit_0])
+
+        self.algo.initial_selection = "knapsack"
+        self.assertEqual(
+            self.algo._initial_selection(index_benefits),
+            [index_benefit_1, index_benefit_2],
+        )
+
+        # If both selections are equally good, the greedy selection is used
+        self.algo.disk_constraint = 3
+        self.assertEqual(self.algo._initial_selection(index_benefits), [index_benefit_0])
+
+    def test_greedy_selection(self):
+        index_benefits = self._index_benefits([2, 5, 1, 3, 1], [10] * 5)
+        self.algo.disk_constraint = 4
+
+        # Indexes that do not fit are skipped, but later smaller ones are still added
+        self.assertEqual(
+            self.algo._greedy_selection(index_benefits),
+            [index_benefits[0], index_benefits[2], index_benefits[4]],
+        )
+        self.assertEqual(self.algo._greedy_selection([]), [])
+
+    def test_knapsack_selection_respects_budget(self):
+        index_0 = Index([self.column_0])
+        index_0.estimated_size = mb_to_b(300)
+        index_1 = Index([self.column_1])
+        index_1.estimated_size = mb_to_b(200) + 1
+        index_2 = Index([self.column_2])
+        index_2.estimated_size = mb_to_b(150)
+        index_benefits = [
+            IndexBenefit(index_0, 30),
+            IndexBenefit(index_1, 20),
+            IndexBenefit(index_2, 10),
+            IndexBenefit(Index([self.column_3]), -5),
+        ]
+        index_benefits[3].index.estimated_size = 1
+
+        # index_0 and index_1 exceed the 500 MB budget by one byte and indexes with
+        # negative benefits are never chosen.
+        self.assertEqual(
+            self.algo._knapsack_selection(index_benefits),
+            [IndexBenefit(index_0, 30), IndexBenefit(index_2, 10)],
+        )
+
+    def test_sample_positions(self):
+        self.assertEqual(_sample_positions(1, 1), [0])
+        positions = _sample_positions(5, 3)
+        self.assertEqual(len(set(positions)), 3)
+        self.assertTrue(all(0 <= position < 5 for position in positions))
+        self.assertCountEqual(_sample_positions(4, 4), [0, 1, 2, 3])
+
+    def test_swap_remove(self):
+        elements = [0, 1, 2, 3, 4]
+        _swap_remove(elements, [1, 4, 3])
+        self.assertCountEqual(elements, [0, 2])
+
+        elements = [0, 1, 2, 3, 4]
+        _swap_remove(elements, [0])
+        self.assertEqual(elements, [4, 1, 2, 3])
+
+        elements = [0, 1, 2]
+        _swap_remove(elements, [])
+        self.assertEqual(elements, [0, 1, 2])
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from selection.index import Index, index_merge, index_split
@@ -59,6 +60,33 @@ class TestIndex(unittest.TestCase):
         # Check comparing object of different class
         self.assertFalse(index_0_1 == int(3))
 
+    def test_index_hash(self):
+        index_0_1 = Index([self.column_0, self.column_1])
+        self.assertEqual(hash(index_0_1), hash((self.column_0, self.column_1)))
+        # The cached hash is returned for subsequent calls
+        self.assertEqual(hash(index_0_1), hash(index_0_1))
+        self.assertEqual(hash(index_0_1), hash(Index([self.column_0, self.column_1])))
+        self.assertNotEqual(hash(index_0_1), hash(Index([self.column_1, self.column_0])))
+
+    def test_index_pickle(self):
+        index_0_1 = Index([self.column_0, self.column_1])
+        hash(index_0_1)
+        self.assertIsNotNone(index_0_1._hash)
+
+        # The cached hash is not part of the pickled state
+        state = index_0_1.__getstate__()
+        self.assertIsNone(state["_hash"])
+        self.assertIsNotNone(index_0_1._hash)
+
+        state["_hash"] = 17
+        loaded_index = Index.__new__(Index)
+        loaded_index.__setstate__(state)
+        self.assertIsNone(loaded_index._hash)
+
+        loaded_index = pickle.loads(pickle.dumps(index_0_1))
+        self.assertEqual(loaded_index, index_0_1)
+        self.assertIn(loaded_index, {index_0_1})
+
     def test_index_column_names(self):
         index_0_1 = Index([self.column_0, self.column_1])
         column_names = index_0_1._column_names()
@@ -120,3 +120,78 @@ class TestSelectionUtilsGenerator(unittest.TestCase):
         self.assertEqual(query_details[query_0], expected_first_result)
         self.assertEqual(query_details[query_1], expected_second_result)
         self.assertEqual(utilized_indexes, {self.index_0, self.index_2})
+
+    def test_get_utilized_indexes_shares_equal_candidates(self):
+        indexes_per_query_call = []
+        requests = []
+
+        class CostEvaluationMock:
+            def which_indexes_utilized_and_cost(_, query, indexes):
+                indexes_per_query_call.append(indexes)
+                requests.append(("utilized", query.nr))
+                return set(), 10
+
+            def calculate_cost(_, workload, indexes):
+                # Costs without indexes unsimulate all indexes
+                requests.append(("cost", workload.queries[0].nr))
+                return 10
+
+        query_0 = Query(0, "SELECT * FROM tableb WHERE col0 = 4;", [self.column_b_0])
+        query_1 = Query(1, "SELECT * FROM tablea WHERE col0 = 4;", [self.column_a_0])
+        query_2 = Query(2, "SELECT * FROM tablea WHERE col0 = 3;", [self.column_a_0])
+        workload = Workload([query_0, query_1, query_2])
+        candidates = candidates_per_query(workload, 2, syntactically_relevant_indexes)
+
+        _, query_details = get_utilized_indexes(
+            workload, candidates, CostEvaluationMock(), detailed_query_information=True
+        )
+        # Queries on the same table are processed consecutively and equal
+        # candidates are passed as the same object
+        self.assertEqual(len(indexes_per_query_call), 3)
+        self.assertIs(indexes_per_query_call[0][0], indexes_per_query_call[1][0])
+        self.assertEqual(indexes_per_query_call[2], [self.index_1])
+        # Costs without indexes are requested before any query is analyzed. Otherwise,
+        # the shared candidates would not stay simulated.
+        self.assertEqual(
+            requests,
+            [("cost", 0), ("cost", 1), ("cost", 2)]
+            + [("utilized", 1), ("utilized", 2), ("utilized", 0)],
+        )
+        # The details are still ordered like the workload
+        self.assertEqual(list(query_details.keys()), [query_0, query_1, query_2])
+
+    def test_get_utilized_indexes_skips_queries(self):
+        requests = []
+
+        class CostEvaluationMock:
+            def which_indexes_utilized_and_cost(_, query, indexes):
+                requests.append(("utilized", query.nr))
+                return {self.index_0}, 17
+
+            def calculate_cost(_, workload, indexes):
+                requests.append(("cost", workload.queries[0].nr))
+                return 170
+
+        query_text = "SELECT * FROM tablea WHERE col0 = 4;"
+        query_0 = Query(0, query_text, [self.column_a_0])
+        query_1 = Query(1, "SELECT 1;")
+        query_2 = Query(2, query_text, [self.column_a_0])
+        workload = Workload([query_0, query_1, query_2])
+        candidates = candidates_per_query(workload, 2, syntactically_relevant_indexes)
+
+        utilized_indexes, query_details = get_utilized_indexes(
+            workload, candidates, CostEvaluationMock(), detailed_query_information=True
+        )
+        # Costs without indexes are requested first. Queries without candidates and
+        # repeated queries are not analyzed (again).
+        self.assertEqual(requests, [("cost", 0), ("cost", 1), ("utilized", 0)])
+        self.assertEqual(utilized_indexes, {self.index_0})
+        self.assertEqual(
+            query_details[query_1],
+            {
+                "cost_without_indexes": 170,
+                "cost_with_indexes": 170,
+                "utilized_indexes": set(),
+            },
+        )
+        self.assertEqual(query_details[query_2], query_details[query_0])
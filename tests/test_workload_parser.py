@@ -1,4 +1,6 @@
+import tempfile
 import unittest
+from unittest.mock import MagicMock, patch
 
 from selection.workload import Column, Query, Table, Workload
 from selection.workload_parser import WorkloadParser
@@ -35,3 +37,87 @@ class TestWorkloadParser(unittest.TestCase):
         self.assertEqual(WorkloadParser.is_custom_workload("tpch"), False)
         self.assertEqual(WorkloadParser.is_custom_workload("tpcds"), False)
         self.assertEqual(WorkloadParser.is_custom_workload("example"), True)
+
+    @patch("selection.workload_parser.PostgresDatabaseConnector")
+    def test_get_tables_single_query(self, connector_mock):
+        connector_mock.return_value.exec_fetchall.return_value = [
+            ("nation", "n_nationkey"),
+            ("nation", "n_name"),
+            ("region", "r_regionkey"),
+        ]
+        workload_parser = WorkloadParser("postgres", "test_db", "example")
+        tables = workload_parser.get_tables()
+
+        connector_mock.return_value.exec_fetchall.assert_called_once()
+        # The schema name is passed as parameter and not part of the statement
+        _, parameters = connector_mock.return_value.exec_fetchall.call_args[0]
+        self.assertEqual(parameters, {"schema": "public"})
+        self.assertEqual(list(tables.keys()), ["nation", "region"])
+        self.assertEqual(
+            [column.name for column in tables["nation"].columns],
+            ["n_nationkey", "n_name"],
+        )
+        self.assertEqual(tables["region"].columns[0].table, tables["region"])
+
+    def test_execute_cached(self):
+        table = Table("lineitem")
+        table.add_columns([Column("l_orderkey"), Column("l_quantity")])
+
+        with tempfile.TemporaryDirectory() as cache_directory:
+            workload_parser = WorkloadParser(
+                "postgres", "test_db", "example", cache_directory=cache_directory
+            )
+            workload_parser.get_tables = MagicMock(return_value={"lineitem": table})
+            workload = workload_parser.execute()
+            workload_parser.get_tables.assert_called_once()
+            self.assertEqual(len(workload.queries), 2)
+            self.assertEqual([query.nr for query in workload.queries], ["1.sql", "2.sql"])
+            self.assertIn("lineitem", workload.queries[0].text)
+
+            # The second parser only retrieves the schema and loads the parsed
+            # workload without reading the query files
+            workload_parser = WorkloadParser(
+                "postgres", "test_db", "example", cache_directory=cache_directory
+            )
+            workload_parser.get_tables = MagicMock(return_value={"lineitem": table})
+            with patch("selection.workload_parser.pathlib.Path.read_text") as read_mock:
+                cached_workload = workload_parser.execute()
+            read_mock.assert_not_called()
+            self.assertEqual(
+                [query.nr for query in cached_workload.queries],
+                [query.nr for query in workload.queries],
+            )
+            self.assertEqual(
+                [query.columns for query in cached_workload.queries],
+                [query.columns for query in workload.queries],
+            )
+
+            # Another database invalidates the cache
+            workload_parser = WorkloadParser(
+                "postgres", "other_db", "example", cache_directory=cache_directory
+            )
+            workload_parser.get_tables = MagicMock(return_value={"lineitem": table})
+            with patch(
+                "selection.workload_parser.pathlib.Path.read_text", return_value=""
+            ) as read_mock:
+                workload_parser.execute()
+            read_mock.assert_called()
+
+            # A changed schema invalidates the cache
+            changed_table = Table("lineitem")
+            changed_table.add_columns([Column("l_orderkey")])
+            workload_parser = WorkloadParser(
+                "postgres", "test_db", "example", cache_directory=cache_directory
+            )
+            workload_parser.get_tables = MagicMock(
+                return_value={"lineitem": changed_table}
+            )
+            changed_workload = workload_parser.execute()
+            self.assertEqual(
+                [column.name for column in changed_workload.queries[0].columns],
+                ["l_orderkey"],
+            )
+
+    def test_execute_not_cached_by_default(self):
+        workload_parser = WorkloadParser("postgres", "test_db", "example")
+        self.assertIsNone(workload_parser.cache_directory)